@@ -0,0 +1,110 @@
+"""
+Бенчмарк нарезки базы знаний: прежняя (только по заголовкам) против нарезки с бюджетом токенов.
+
+Для каждого варианта строит индекс Chroma во временном каталоге и печатает число чанков,
+токены (всего / максимум / сколько чанков длиннее 512 — их e5 обрезает), время эмбеддинга,
+размер индекса на диске и сколько токенов retrieve_knowledge отдаёт на запрос.
+
+    python3 -m benchmarks.chunking_bench --top-k 6
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from config import config
+from knowledge_base.chunker import make_token_counter
+from knowledge_base.vector_store.chroma_repo import ChromaVectorStore
+from rebuild_index import load_documents_from_folder
+from tools.rag_tool import fit_to_budget
+
+E5_MAX_TOKENS = 512
+
+QUERIES = [
+    "Как вернуть кроссовки, если не подошёл размер?",
+    "Какие способы оплаты доступны?",
+    "Где находятся ваши склады?",
+    "Как ухаживать за замшевыми кроссовками?",
+    "Как выбрать кроссовки для бега?",
+    "Как связаться со службой поддержки?",
+    "Как оформить заказ в приложении?",
+    "Сколько идёт доставка в Казахстан?",
+]
+
+
+def load_documents_by_headers(folder: str = "knowledge_base/raw"):
+    """Прежняя нарезка из rebuild_index.py: новый чанк на каждом заголовке, без ограничения длины."""
+    chunks, metadatas, ids = [], [], []
+    for file_path in sorted(Path(folder).rglob("*.md")):
+        current_chunk, current_header = [], file_path.name
+        for line in file_path.read_text(encoding="utf-8").split("\n"):
+            stripped = line.strip()
+            if stripped.startswith("#"):
+                if current_chunk:
+                    chunks.append("\n".join(current_chunk).strip())
+                    metadatas.append({"source": file_path.name, "header": current_header})
+                    ids.append(f"{file_path.stem}_{len(chunks)}")
+                current_chunk = [line]
+                current_header = stripped
+            else:
+                current_chunk.append(line)
+        if current_chunk:
+            chunks.append("\n".join(current_chunk).strip())
+            metadatas.append({"source": file_path.name, "header": current_header})
+            ids.append(f"{file_path.stem}_{len(chunks)}")
+    return chunks, metadatas, ids
+
+
+def dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def bench(label: str, documents, count_tokens, top_k: int, budgeted: bool):
+    chunks, metadatas, ids = documents
+    tokens = [count_tokens(chunk) for chunk in chunks]
+    for meta, count in zip(metadatas, tokens):
+        meta.setdefault("token_count", count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChromaVectorStore(persist_dir=tmp, collection_name="bench")
+        started = time.perf_counter()
+        store.add_documents(chunks, metadatas, ids)
+        embed_time = time.perf_counter() - started
+        index_size = dir_size(Path(tmp))
+
+        retrieved = []
+        for query in QUERIES:
+            results = store.similarity_search(query, k=top_k)
+            if budgeted:
+                results = fit_to_budget(results, config["rag"].get("max_context_tokens", 1500))
+            retrieved.append(sum(count_tokens(res["text"]) for res in results))
+
+    print(f"{label}:")
+    print(
+        f"  чанков: {len(chunks)}, токенов: всего {sum(tokens)}, максимум {max(tokens)}, "
+        f"медиана {statistics.median(tokens):.0f}, длиннее {E5_MAX_TOKENS}: {sum(t > E5_MAX_TOKENS for t in tokens)}"
+    )
+    print(f"  эмбеддинг: {embed_time:.2f} c, индекс на диске: {index_size / 1024:.0f} КБ")
+    print(
+        f"  токенов в ответе retrieve_knowledge (top_k={top_k}): "
+        f"среднее {statistics.mean(retrieved):.0f}, максимум {max(retrieved)}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк нарезки базы знаний")
+    parser.add_argument("--top-k", type=int, default=6)
+    args = parser.parse_args()
+
+    count_tokens = make_token_counter(config["rag"]["embedding_model"])
+
+    bench("Было: нарезка по заголовкам", load_documents_by_headers(), count_tokens, args.top_k, budgeted=False)
+    bench(
+        "Стало: бюджет токенов + перекрытие",
+        load_documents_from_folder(count_tokens=count_tokens),
+        count_tokens,
+        args.top_k,
+        budgeted=True,
+    )
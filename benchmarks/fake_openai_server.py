@@ -0,0 +1,144 @@
+"""
+Локальный фейковый OpenAI-совместимый сервер для нагрузочных тестов LLM-клиента.
+
+Отвечает на POST */chat/completions шаблонным ответом с задержкой, умеет
+имитировать 429 (случайно и по собственному лимиту запросов в минуту).
+GET /stats — счётчики запросов, ошибок и уникальных TCP-соединений.
+
+    python3 benchmarks/fake_openai_server.py --port 8089 --latency 0.2 --error-rate 0.1
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, error_rate=0.0, rpm_limit=None):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rpm_limit = rpm_limit
+        self.lock = threading.Lock()
+        self.recent = deque()
+        self.stats = {"requests": 0, "ok": 0, "rate_limited": 0, "connections": 0}
+
+    def should_reject(self) -> bool:
+        with self.lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            while self.recent and now - self.recent[0] > 60:
+                self.recent.popleft()
+            if self.rpm_limit and len(self.recent) >= self.rpm_limit:
+                self.stats["rate_limited"] += 1
+                return True
+            if random.random() < self.error_rate:
+                self.stats["rate_limited"] += 1
+                return True
+            self.recent.append(now)
+            self.stats["ok"] += 1
+            return False
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    # keep-alive: без HTTP/1.1 каждый запрос открывал бы новое соединение
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.server.lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        if self.server.should_reject():
+            self._send_json(
+                429,
+                {"error": {"message": "Resource exhausted", "type": "rate_limit_error", "code": 429}},
+                headers={"Retry-After": "1"},
+            )
+            return
+
+        time.sleep(self.server.latency)
+
+        prompt_tokens = len(json.dumps(request.get("messages", []), ensure_ascii=False)) // 4
+        content = "Фейковый ответ SneakerHub."
+        self._send_json(
+            200,
+            {
+                "id": f"chatcmpl-{random.getrandbits(32):08x}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "fake-model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": 8,
+                    "total_tokens": prompt_tokens + 8,
+                },
+            },
+        )
+
+
+def start_server(host="127.0.0.1", port=0, **kwargs) -> FakeOpenAIServer:
+    """Запускает сервер в фоновом потоке (port=0 — любой свободный порт)."""
+    server = FakeOpenAIServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Фейковый OpenAI-совместимый сервер")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка ответа, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля случайных 429")
+    parser.add_argument("--rpm-limit", type=int, default=None, help="Лимит запросов в минуту")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        (args.host, args.port),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rpm_limit=args.rpm_limit,
+    )
+    print(f"Фейковый OpenAI-сервер: http://{args.host}:{args.port}/v1/")
+    server.serve_forever()
@@ -0,0 +1,89 @@
+"""
+Нагрузочный тест PooledOpenAIModel против локального фейкового сервера.
+
+Запуск из корня проекта:
+
+    python3 -m benchmarks.llm_load_test --requests 200 --concurrency 32 --unique 50 --error-rate 0.1
+
+Печатает задержки (p50/p95/max), число ошибок, сколько запросов реально дошло
+до сервера (эффект склейки) и сколько TCP-соединений было открыто (эффект пула).
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from smolagents import ChatMessage, MessageRole
+
+from benchmarks.fake_openai_server import start_server
+from llm.pooled_model import PooledOpenAIModel
+
+
+def run(args):
+    server = start_server(latency=args.latency, error_rate=args.error_rate, rpm_limit=args.server_rpm)
+    base = f"http://127.0.0.1:{server.server_address[1]}/v1/"
+
+    model = PooledOpenAIModel(
+        model_id="fake-model",
+        api_base=base,
+        api_key="fake",
+        max_connections=args.concurrency,
+        max_keepalive_connections=args.concurrency,
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        deadline=args.deadline,
+        coalesce=not args.no_coalesce,
+    )
+
+    prompts = [f"Какие беговые кроссовки есть в наличии? #{random.randrange(args.unique)}" for _ in range(args.requests)]
+
+    def call(prompt):
+        started = time.perf_counter()
+        try:
+            model.generate([ChatMessage(role=MessageRole.USER, content=[{"type": "text", "text": prompt}])])
+            return time.perf_counter() - started, None
+        except Exception as e:
+            return time.perf_counter() - started, type(e).__name__
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(call, prompts))
+    elapsed = time.perf_counter() - started
+
+    with urllib.request.urlopen(base + "stats") as resp:
+        stats = json.loads(resp.read())
+
+    model.close()
+    server.shutdown()
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = [error for _, error in results if error]
+    print(f"Вызовов: {len(results)} за {elapsed:.2f} c ({len(results) / elapsed:.1f} вызовов/с)")
+    print(
+        f"Задержка: p50={statistics.median(latencies):.3f} c, "
+        f"p95={latencies[int(len(latencies) * 0.95) - 1]:.3f} c, max={latencies[-1]:.3f} c"
+    )
+    print(f"Ошибок: {len(errors)} {sorted(set(errors)) if errors else ''}")
+    print(
+        f"Сервер: запросов={stats['requests']}, успешных={stats['ok']}, "
+        f"429={stats['rate_limited']}, TCP-соединений={stats['connections']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест LLM-клиента")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--unique", type=int, default=50, help="Число различных промптов (остальные — дубли)")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--server-rpm", type=int, default=None)
+    parser.add_argument("--rpm", type=float, default=None, help="Клиентский лимит запросов/мин")
+    parser.add_argument("--tpm", type=float, default=None, help="Клиентский лимит токенов/мин")
+    parser.add_argument("--deadline", type=float, default=30.0)
+    parser.add_argument("--no-coalesce", action="store_true")
+    run(parser.parse_args())
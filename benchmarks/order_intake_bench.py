@@ -0,0 +1,123 @@
+"""
+Бенчмарк приёма заявок: заявок/с при одновременных запросах к каталогу.
+
+Сравнивает прежнюю схему (соединение + INSERT + COMMIT на каждую заявку, журнал по умолчанию)
+с OrderWriter (один поток-писатель, WAL, group commit). Каждый прогон — на свежей временной БД
+из init_sneakers_db.sql.
+
+    python3 -m benchmarks.order_intake_bench --orders 2000 --writers 16 --readers 4
+"""
+
+import argparse
+import json
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from tools.order_writer import OrderWriter
+
+CATALOG_QUERY = """
+SELECT p.article, pm.brand, pm.model, p.size, p.color, p.price, s.warehouse, COALESCE(s.quantity, 0)
+FROM products p
+JOIN product_models pm ON p.model_id = pm.id
+LEFT JOIN stock_by_warehouses s ON s.product_id = p.id
+WHERE pm.brand LIKE ?
+ORDER BY p.article, p.size, s.warehouse
+"""
+
+
+def make_db(folder: str, name: str) -> str:
+    path = str(Path(folder) / name)
+    conn = sqlite3.connect(path)
+    conn.executescript(Path("init_sneakers_db.sql").read_text(encoding="utf-8"))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def make_order(i: int) -> tuple:
+    items = [{"brand": "Nike", "model": "Air Max 90", "size": 42.0 + i % 5, "color": "Black", "quantity": 1, "price": 143.0}]
+    order_data = {"items": items, "total_price": 143.0, "warehouse_preference": None, "notes": None, "created_at": "2025-01-01T00:00:00"}
+    return f"user_{i}", "Иван", "+70000000000", order_data
+
+
+def legacy_insert(db_path: str, order: tuple) -> int:
+    user_id, name, phone, order_data = order
+    conn = sqlite3.connect(db_path, timeout=30)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO orders (user_id, customer_name, customer_phone, order_json) VALUES (?, ?, ?, ?)",
+        (user_id, name, phone, json.dumps(order_data, ensure_ascii=False, indent=2)),
+    )
+    order_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    return order_id
+
+
+def run_readers(db_path: str, count: int, stop: threading.Event, latencies: list):
+    def reader():
+        brands = ["Nike", "Adidas", "Puma", "Asics"]
+        i = 0
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                conn = sqlite3.connect(db_path, timeout=30)
+                conn.execute(CATALOG_QUERY, (f"%{brands[i % len(brands)]}%",)).fetchall()
+                conn.close()
+            except sqlite3.OperationalError:
+                pass
+            latencies.append(time.perf_counter() - started)
+            i += 1
+
+    threads = [threading.Thread(target=reader, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def bench(label: str, db_path: str, submit, args):
+    stop = threading.Event()
+    read_latencies = []
+    readers = run_readers(db_path, args.readers, stop, read_latencies)
+
+    orders = [make_order(i) for i in range(args.orders)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.writers) as pool:
+        ids = list(pool.map(submit, orders))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    read_latencies.sort()
+    p95 = read_latencies[int(len(read_latencies) * 0.95) - 1] if read_latencies else 0
+    print(f"{label}:")
+    print(f"  заявок: {len(set(ids))} за {elapsed:.2f} c — {len(ids) / elapsed:.0f} заявок/с")
+    print(
+        f"  чтений каталога: {len(read_latencies)} ({len(read_latencies) / elapsed:.0f}/с), "
+        f"p50={statistics.median(read_latencies) * 1000:.1f} мс, p95={p95 * 1000:.1f} мс"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк приёма заявок")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=16, help="Параллельных отправителей заявок")
+    parser.add_argument("--readers", type=int, default=4, help="Параллельных читателей каталога")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = make_db(tmp, "legacy.db")
+        bench("Прежняя схема (коммит на заявку)", legacy_db, lambda order: legacy_insert(legacy_db, order), args)
+
+        writer_db = make_db(tmp, "writer.db")
+        writer = OrderWriter(writer_db, batch_size=args.batch_size)
+        bench("OrderWriter (WAL + group commit)", writer_db, lambda order: writer.submit(*order).result().order_id, args)
+        writer.close()
@@ -0,0 +1,81 @@
+import argparse
+import json
+import sqlite3
+import sys
+from config import config
+from tools.stock_aggregates import BASE_WAREHOUSE_STOCK_QUERY, rebuild_aggregates
+
+
+def check_aggregates(conn: sqlite3.Connection) -> list[str]:
+    """Сверяет model_warehouse_stock и model_stock_totals с базовыми таблицами. Возвращает список расхождений."""
+    problems = []
+
+    expected = {(m, wh): qty for m, wh, qty in conn.execute(BASE_WAREHOUSE_STOCK_QUERY)}
+    actual = {
+        (m, wh): qty
+        for m, wh, qty in conn.execute("SELECT model_id, warehouse, quantity FROM model_warehouse_stock")
+    }
+    for key in sorted(expected.keys() | actual.keys(), key=str):
+        if expected.get(key) != actual.get(key):
+            problems.append(
+                f"model_warehouse_stock {key}: ожидается {expected.get(key)}, в агрегате {actual.get(key)}"
+            )
+
+    per_model = {}
+    for (model_id, warehouse), qty in expected.items():
+        per_model.setdefault(model_id, {})[warehouse] = qty
+
+    totals = {
+        model_id: (total, stock_json)
+        for model_id, total, stock_json in conn.execute(
+            "SELECT model_id, total_stock, stock_json FROM model_stock_totals"
+        )
+    }
+    for (model_id,) in conn.execute("SELECT id FROM product_models ORDER BY id"):
+        stock = per_model.get(model_id, {})
+        if model_id not in totals:
+            problems.append(f"model_stock_totals {model_id}: нет строки")
+            continue
+        total, stock_json = totals.pop(model_id)
+        if total != sum(stock.values()):
+            problems.append(f"model_stock_totals {model_id}: total_stock {total}, ожидается {sum(stock.values())}")
+        try:
+            if json.loads(stock_json) != stock:
+                problems.append(f"model_stock_totals {model_id}: stock_json {stock_json}, ожидается {json.dumps(stock)}")
+        except (TypeError, json.JSONDecodeError):
+            problems.append(f"model_stock_totals {model_id}: некорректный stock_json {stock_json!r}")
+
+    for model_id in totals:
+        problems.append(f"model_stock_totals {model_id}: строка для несуществующей модели")
+
+    return problems
+
+
+if __name__ == "__main__":
+    db_path = config["database"]["path"]
+    parser = argparse.ArgumentParser(description="Проверка агрегатов остатков по базовым таблицам")
+    parser.add_argument("--db", default=db_path, help=f"Путь к БД (по умолчанию {db_path})")
+    parser.add_argument("--rebuild", action="store_true", help="Создать агрегаты и триггеры (если их нет) и пересобрать агрегаты")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.rebuild:
+        rebuild_aggregates(conn)
+        print("Агрегаты пересобраны.")
+
+    try:
+        problems = check_aggregates(conn)
+    except sqlite3.OperationalError as e:
+        print(f"Агрегаты остатков не созданы ({e}). Для создания: python3 check_stock_aggregates.py --rebuild")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+    if problems:
+        print(f"Найдено расхождений: {len(problems)}")
+        for problem in problems:
+            print(f"  {problem}")
+        print("Для исправления: python3 check_stock_aggregates.py --rebuild")
+        sys.exit(1)
+
+    print("Агрегаты остатков согласованы с базовыми таблицами.")
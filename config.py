@@ -1,15 +1,61 @@
 import yaml
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 
-CONFIG_PATH = Path("config.yaml")
+# Путь от расположения модуля, а не от текущего каталога запуска
+CONFIG_PATH = Path(__file__).resolve().parent / "config.yaml"
 
 
-def load_config():
-    if not CONFIG_PATH.exists():
-        raise FileNotFoundError(f"Конфиг не найден: {CONFIG_PATH}")
+def load_config(path: Path = CONFIG_PATH):
+    if not path.exists():
+        raise FileNotFoundError(f"Конфиг не найден: {path}")
 
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 
-config = load_config()
+class ReloadableConfig:
+    """
+    Текущий конфиг с доступом как к dict (`config["rag"]["top_k"]`).
+    Значения читаются в момент обращения, поэтому после `replace()` все модули видят новый конфиг.
+    Подменяет конфиг только RuntimeRegistry (runtime.py); на время запроса к агенту он закрепляет
+    свой снимок через `pinned()`, и инструменты этого запроса не видят подмену посреди работы.
+    """
+
+    def __init__(self, data: dict):
+        self._data = data
+        # contextvars копируются в потоки инструментов smolagents и в asyncio.to_thread
+        self._pinned = ContextVar("pinned_config", default=None)
+
+    def _current(self) -> dict:
+        pinned = self._pinned.get()
+        return self._data if pinned is None else pinned
+
+    def __getitem__(self, key):
+        return self._current()[key]
+
+    def __contains__(self, key):
+        return key in self._current()
+
+    def get(self, key, default=None):
+        return self._current().get(key, default)
+
+    def snapshot(self) -> dict:
+        return self._current()
+
+    def replace(self, data: dict):
+        # Присваивание ссылки атомарно: читатель видит либо старый, либо новый конфиг целиком
+        self._data = data
+
+    @contextmanager
+    def pinned(self, data: dict):
+        """Закрепляет снимок конфига за текущим контекстом (запросом)."""
+        token = self._pinned.set(data)
+        try:
+            yield
+        finally:
+            self._pinned.reset(token)
+
+
+config = ReloadableConfig(load_config())
@@ -33,9 +33,12 @@ CREATE TABLE IF NOT EXISTS orders (
     customer_name TEXT,
     customer_phone TEXT,
     order_json TEXT,                 -- весь заказ в JSON
-    status TEXT DEFAULT 'new'
+    status TEXT DEFAULT 'new',
+    idempotency_key TEXT             -- хэш пользователя и состава заказа (защита от дублей)
 );
 
+-- Агрегаты остатков и их триггеры — в stock_aggregates.sql (создаются и заполняются отдельно)
+
 -- 5. Полная очистка перед заполнением
 DELETE FROM stock_by_warehouses;
 DELETE FROM products;
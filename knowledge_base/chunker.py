@@ -0,0 +1,331 @@
+import re
+import sys
+from dataclasses import dataclass, replace
+from typing import Callable, List, Optional
+
+HEADER_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_ITEM_RE = re.compile(r"^\s*([-*+]|\d+[.)])\s+")
+RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+TABLE_SEPARATOR_RE = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+@dataclass
+class Chunk:
+    text: str
+    header_path: List[str]
+    token_count: int
+    byte_start: int  # смещения фрагмента в исходном файле (UTF-8)
+    byte_end: int
+
+
+@dataclass
+class _Block:
+    kind: str  # header | paragraph | list | table | code
+    lines: List[str]
+    start: int  # смещения в символах
+    end: int
+    header_path: List[str]
+
+
+@dataclass
+class _Unit:
+    text: str
+    start: int
+    end: int
+    sep: str  # разделитель перед юнитом внутри чанка
+    tokens: int
+    context: str = ""  # что приписать, если юнит открывает чанк (шапка таблицы)
+
+
+def make_token_counter(model_name: str) -> Callable[[str], int]:
+    """Счётчик токенов токенизатором модели эмбеддингов (тот же, что и при индексации)."""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    # Только считаем токены — предупреждения о превышении 512 здесь не нужны
+    tokenizer.model_max_length = sys.maxsize
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def _line_kind(line: str) -> str:
+    stripped = line.strip()
+    if stripped.startswith("|"):
+        return "table"
+    if LIST_ITEM_RE.match(line):
+        return "list"
+    return "paragraph"
+
+
+def _parse_blocks(text: str) -> List[_Block]:
+    """Разбирает markdown на блоки: заголовки, абзацы, списки, таблицы, код."""
+    blocks = []
+    headers = []  # [(уровень, заголовок)]
+    current: Optional[_Block] = None
+    in_code = False
+    pos = 0
+
+    def close():
+        nonlocal current
+        if current:
+            blocks.append(current)
+        current = None
+
+    for line in text.splitlines(keepends=True):
+        start, end = pos, pos + len(line.rstrip("\r\n"))
+        pos += len(line)
+        line = line.rstrip("\r\n")
+        stripped = line.strip()
+        path = [title for _, title in headers]
+
+        if in_code:
+            current.lines.append(line)
+            current.end = end
+            if stripped.startswith("```"):
+                in_code = False
+                close()
+            continue
+
+        if stripped.startswith("```"):
+            close()
+            current = _Block("code", [line], start, end, path)
+            in_code = True
+            continue
+
+        header = HEADER_RE.match(line)
+        if header:
+            close()
+            level, title = len(header.group(1)), header.group(2)
+            while headers and headers[-1][0] >= level:
+                headers.pop()
+            headers.append((level, title))
+            blocks.append(_Block("header", [line], start, end, [t for _, t in headers]))
+            continue
+
+        if not stripped or RULE_RE.match(line):
+            close()
+            continue
+
+        kind = _line_kind(line)
+        # Строки с отступом после пункта списка — его продолжение
+        if current and current.kind == "list" and kind == "paragraph" and line[:1].isspace():
+            kind = "list"
+        if current and current.kind == kind:
+            current.lines.append(line)
+            current.end = end
+        else:
+            close()
+            current = _Block(kind, [line], start, end, path)
+
+    close()
+    return blocks
+
+
+def _split_by_words(text: str, start: int, sep: str, max_tokens: int, count_tokens) -> List[_Unit]:
+    units = []
+    words = list(re.finditer(r"\S+", text))
+    i = 0
+    while i < len(words):
+        j = i + 1
+        # Жадно набираем слова, пока кусок влезает в бюджет
+        while j < len(words) and count_tokens(text[words[i].start():words[j].end()]) <= max_tokens:
+            j += 1
+        piece_start, piece_end = words[i].start(), words[j - 1].end()
+        piece = text[piece_start:piece_end]
+        units.append(_Unit(piece, start + piece_start, start + piece_end, sep if not units else " ", count_tokens(piece)))
+        i = j
+    return units
+
+
+def _block_units(block: _Block, source: str, max_tokens: int, count_tokens) -> List[_Unit]:
+    """Блок целиком, если влезает в бюджет; иначе — по пунктам списка, строкам таблицы или предложениям."""
+    text = source[block.start:block.end]
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return [_Unit(text, block.start, block.end, "\n\n", tokens)]
+
+    pieces = []  # (текст, начало, разделитель, контекст)
+    if block.kind == "list":
+        offset = block.start
+        item_lines, item_start = [], None
+        for line in block.lines:
+            line_start = source.index(line, offset)
+            offset = line_start + len(line)
+            if LIST_ITEM_RE.match(line) and item_lines:
+                pieces.append(("\n".join(item_lines), item_start, "\n", ""))
+                item_lines = []
+            if not item_lines:
+                item_start = line_start
+            item_lines.append(line)
+        pieces.append(("\n".join(item_lines), item_start, "\n", ""))
+    elif block.kind == "table":
+        head_size = 2 if len(block.lines) > 1 and TABLE_SEPARATOR_RE.match(block.lines[1]) else 1
+        head = "\n".join(block.lines[:head_size])
+        offset = block.start
+        for i, line in enumerate(block.lines):
+            line_start = source.index(line, offset)
+            offset = line_start + len(line)
+            if i < head_size:
+                continue
+            pieces.append((line, line_start, "\n", head))
+        if pieces:
+            # Шапка таблицы — часть первой строки, дальше подставляется как контекст
+            first_text, _, sep, _ = pieces[0]
+            pieces[0] = (head + "\n" + first_text, block.start, sep, "")
+    elif block.kind == "code":
+        offset = block.start
+        for line in block.lines:
+            line_start = source.index(line, offset)
+            offset = line_start + len(line)
+            pieces.append((line, line_start, "\n", ""))
+    else:
+        last = 0
+        for match in SENTENCE_END_RE.finditer(text):
+            pieces.append((text[last:match.start()], block.start + last, " ", ""))
+            last = match.end()
+        pieces.append((text[last:], block.start + last, " ", ""))
+
+    units = []
+    for piece_text, piece_start, sep, context in pieces:
+        if not piece_text.strip():
+            continue
+        sep = "\n\n" if not units else sep
+        piece_tokens = count_tokens(piece_text)
+        if piece_tokens <= max_tokens:
+            units.append(
+                _Unit(
+                    piece_text,
+                    piece_start,
+                    piece_start + len(piece_text),
+                    sep,
+                    piece_tokens,
+                    context,
+                )
+            )
+        else:
+            units.extend(_split_by_words(piece_text, piece_start, sep, max_tokens, count_tokens))
+    return units
+
+
+def chunk_markdown(
+    text: str,
+    count_tokens: Callable[[str], int],
+    max_tokens: int = 300,
+    overlap_tokens: int = 40,
+) -> List[Chunk]:
+    """
+    Режет markdown на чанки не длиннее `max_tokens` токенов.
+
+    Чанк не пересекает заголовки; длинный раздел режется по границам блоков, а слишком
+    длинный блок — по пунктам списка, строкам таблицы (с повтором шапки) или предложениям.
+    Соседние чанки одного раздела перекрываются на `overlap_tokens` токенов.
+    Продолжение раздела начинается со строки его заголовка. Бюджет проверяется по собранному
+    тексту чанка; превысить его может только заголовок, который сам длиннее `max_tokens`.
+    """
+    blocks = _parse_blocks(text)
+
+    sections = []  # [(строка заголовка, путь, блоки)]
+    for block in blocks:
+        if block.kind == "header" or not sections:
+            header = block if block.kind == "header" else None
+            sections.append((header, block.header_path, []))
+            if header:
+                continue
+        sections[-1][2].append(block)
+
+    chunks = []
+    for header, header_path, section_blocks in sections:
+        if not section_blocks:
+            continue
+
+        units = []
+        header_line, header_tokens = "", 0
+        if header:
+            header_line = header.lines[0]
+            header_tokens = count_tokens(header_line)
+            units.append(_Unit(header_line, header.start, header.end, "", header_tokens))
+        for block in section_blocks:
+            units.extend(_block_units(block, text, max_tokens - header_tokens, count_tokens))
+
+        def assemble(parts: List[_Unit]) -> str:
+            first = parts[0]
+            pieces = []
+            if header and first.start != header.start:
+                pieces.append(header_line + "\n\n")
+            if first.context:
+                pieces.append(first.context + "\n")
+            pieces.append(first.text)
+            for unit in parts[1:]:
+                pieces.append(unit.sep + unit.text)
+            return "".join(pieces).strip()
+
+        # Бюджет проверяем по собранному тексту: разделители, повтор заголовка и шапки таблицы
+        # тоже стоят токенов, а токенизатор не аддитивен
+        def fits(parts: List[_Unit]) -> bool:
+            return count_tokens(assemble(parts)) <= max_tokens
+
+        def emit(parts: List[_Unit]):
+            first = parts[0]
+            chunk_text = assemble(parts)
+            chunks.append(
+                Chunk(
+                    text=chunk_text,
+                    header_path=header_path,
+                    token_count=count_tokens(chunk_text),
+                    byte_start=len(text[:first.start].encode("utf-8")),
+                    byte_end=len(text[:parts[-1].end].encode("utf-8")),
+                )
+            )
+
+        def split_to_fit(unit: _Unit) -> List[_Unit]:
+            """Юнит, который вместе с заголовком и контекстом не влезает в чанк, режется по словам мельче."""
+            if fits([unit]):
+                return [unit]
+            overhead = count_tokens(assemble([unit])) - unit.tokens
+            budget = max(1, min(unit.tokens, max_tokens - overhead))
+            while True:
+                pieces = _split_by_words(unit.text, unit.start, unit.sep, budget, count_tokens)
+                for piece in pieces:
+                    piece.context = unit.context
+                if all(fits([piece]) for piece in pieces):
+                    return pieces
+                if budget == 1:
+                    # Остались слова длиннее бюджета (ссылки, e-mail) — режем их по символам
+                    return [part for piece in pieces for part in split_by_chars(piece)]
+                budget -= 1
+
+        def split_by_chars(unit: _Unit) -> List[_Unit]:
+            parts, offset = [], 0
+            while offset < len(unit.text):
+                size = len(unit.text) - offset
+                part = replace(unit, text=unit.text[offset:], start=unit.start + offset)
+                while size > 1 and not fits([part]):
+                    size -= 1
+                    part = replace(part, text=unit.text[offset:offset + size], end=part.start + size)
+                part.sep = unit.sep if not parts else ""
+                part.tokens = count_tokens(part.text)
+                parts.append(part)
+                offset += size
+            return parts
+
+        current = []
+        for unit in (piece for unit in units for piece in split_to_fit(unit)):
+            if current and not fits(current + [unit]):
+                emit(current)
+                # Перекрытие: хвост предыдущего чанка (целыми юнитами), если он влезает вместе с новым юнитом
+                carry, carry_tokens = [], 0
+                for prev in reversed(current):
+                    if prev.start == (header.start if header else -1):
+                        break
+                    if carry_tokens + prev.tokens > overlap_tokens:
+                        break
+                    carry.insert(0, prev)
+                    carry_tokens += prev.tokens
+                while carry and not fits(carry + [unit]):
+                    carry.pop(0)
+                current = carry
+            current.append(unit)
+        if current:
+            emit(current)
+
+    return chunks
@@ -1,30 +1,84 @@
+import os
+import shutil
+import time
+from pathlib import Path
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
 from typing import List, Dict, Optional
 from .protocol import VectorStoreRepository
 from config import config
 
+DEFAULT_INDEX_DIR = "knowledge_base/chroma_db"
+
+# Индекс хранится версиями: index_dir/<версия>/, а файл CURRENT указывает на готовую.
+# Перестройка пишет новую версию рядом и подменяет указатель одной атомарной операцией —
+# запущенный бот не видит ни пустой, ни наполовину заполненной коллекции
+CURRENT_INDEX_FILE = "CURRENT"
+INDEX_VERSION_PREFIX = "version-"
+
+
+def make_embedding_function(embedding_model: str) -> SentenceTransformerEmbeddingFunction:
+    return SentenceTransformerEmbeddingFunction(
+        model_name=embedding_model,
+        normalize_embeddings=True,
+    )
+
+
+def resolve_index_dir(index_dir: str) -> str:
+    """Каталог текущей версии индекса; для индекса, собранного до появления версий, — сам index_dir."""
+    try:
+        version = (Path(index_dir) / CURRENT_INDEX_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return index_dir
+    return str(Path(index_dir) / version)
+
+
+def new_index_version(index_dir: str) -> str:
+    """Создаёт пустой каталог для новой версии индекса и возвращает имя версии."""
+    version = f"{INDEX_VERSION_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    (Path(index_dir) / version).mkdir(parents=True)
+    return version
+
+
+def publish_index_version(index_dir: str, version: str):
+    """
+    Делает версию текущей и удаляет остальные, кроме предыдущей: ею ещё могут пользоваться
+    начатые запросы запущенного бота, пока он не переключился на новую.
+    """
+    pointer = Path(index_dir) / CURRENT_INDEX_FILE
+    previous = Path(resolve_index_dir(index_dir)).name
+    tmp = pointer.with_name(pointer.name + ".tmp")
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, pointer)
+
+    for path in Path(index_dir).glob(f"{INDEX_VERSION_PREFIX}*"):
+        if path.is_dir() and path.name not in (version, previous):
+            shutil.rmtree(path, ignore_errors=True)
+
 
 class ChromaVectorStore(VectorStoreRepository):
     def __init__(
         self,
-        persist_dir: str = "knowledge_base/chroma_db",
+        persist_dir: Optional[str] = None,
         collection_name: str = "support_kb",
         # embedding_model: str = "all-MiniLM-L6-v2",
         # embedding_model: str = "intfloat/multilingual-e5-large-instruct",
-        embedding_model: str = config["rag"]["embedding_model"],
+        embedding_model: Optional[str] = None,
+        embedding_function: Optional[SentenceTransformerEmbeddingFunction] = None,
     ):
         import chromadb  # локальный импорт, чтобы избежать F401 на верхнем уровне
 
-        self.client = chromadb.PersistentClient(path=persist_dir)
+        # Значения по умолчанию — из текущего конфига в момент создания (конфиг перезагружаемый)
+        self.persist_dir = persist_dir or resolve_index_dir(config["rag"].get("index_dir", DEFAULT_INDEX_DIR))
+        self.embedding_model = embedding_model or config["rag"]["embedding_model"]
 
-        embedding_function = SentenceTransformerEmbeddingFunction(
-            model_name=embedding_model,
-            normalize_embeddings=True,
-        )
+        self.client = chromadb.PersistentClient(path=self.persist_dir)
+
+        # Уже загруженную модель можно передать готовой — без повторной загрузки весов
+        self.embedding_function = embedding_function or make_embedding_function(self.embedding_model)
 
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            embedding_function=embedding_function,
+            embedding_function=self.embedding_function,
         )
 
     def add_documents(
@@ -65,6 +119,22 @@ class ChromaVectorStore(VectorStoreRepository):
             )
         ]
 
+    def clear(self):
+        """Удаляет все документы: коллекция пересоздаётся, модель эмбеддингов не перезагружается."""
+        name = self.collection.name
+        self.client.delete_collection(name)
+        self.collection = self.client.get_or_create_collection(
+            name=name,
+            embedding_function=self.embedding_function,
+        )
+
+    def close(self):
+        """
+        Сбрасывает общий кэш клиентов Chroma, который держит систему каждого открытого каталога
+        до конца процесса: после подмены версии индекса прежняя иначе так и осталась бы в памяти.
+        """
+        self.client.clear_system_cache()
+
     def delete_collection(self):
         try:
             self.client.delete_collection(self.collection.name)
@@ -16,4 +16,8 @@ class VectorStoreRepository(Protocol):
         filter: Optional[Dict] = None,
     ) -> List[Dict]: ...
 
+    def clear(self) -> None: ...
+
+    def close(self) -> None: ...
+
     def delete_collection(self) -> None: ...
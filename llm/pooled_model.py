@@ -0,0 +1,261 @@
+import hashlib
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+from smolagents import OpenAIModel
+
+# HTTP-статусы, при которых имеет смысл повторить запрос
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Потокобезопасный token bucket: `rate_per_minute` единиц в минуту, не больше `capacity` за раз.
+    Если rate не задан — ограничение отключено.
+    """
+
+    def __init__(self, rate_per_minute: Optional[float], capacity: Optional[float] = None):
+        self.enabled = bool(rate_per_minute)
+        self.rate = (rate_per_minute or 0) / 60.0
+        self.capacity = capacity or rate_per_minute or 0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount: float, deadline: float):
+        """Ждёт, пока в корзине наберётся `amount` единиц. Бросает TimeoutError, если не успевает к `deadline`."""
+        if not self.enabled:
+            return
+        # Запрос больше ёмкости корзины иначе не пройдёт никогда
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if time.monotonic() + wait > deadline:
+                raise TimeoutError("Лимит запросов к LLM исчерпан, дедлайн вызова истёк в очереди.")
+            time.sleep(wait)
+
+    def adjust(self, delta: float):
+        """Корректирует баланс после фактического расхода (может уйти в минус — тогда следующие подождут)."""
+        if not self.enabled:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens -= delta
+
+
+class _GuardedCompletions:
+    """Обёртка над `client.chat.completions`: лимиты, ретраи, дедлайн и склейка одинаковых запросов."""
+
+    def __init__(self, owner: "PooledOpenAIModel", completions):
+        self.owner = owner
+        self.completions = completions
+
+    def create(self, **kwargs):
+        return self.owner._guarded_create(self.completions.create, kwargs)
+
+
+class _GuardedClient:
+    def __init__(self, owner: "PooledOpenAIModel", client):
+        self._client = client
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = _GuardedCompletions(owner, client.chat.completions)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def close(self):
+        self._client.close()
+
+
+class PooledOpenAIModel(OpenAIModel):
+    """
+    OpenAIModel для OpenAI-совместимых API (Gemini и т.п.) с:
+      - пулом keep-alive HTTP-соединений (httpx),
+      - клиентским ограничением requests/min и tokens/min (token bucket),
+      - повторами с экспоненциальной задержкой и jitter (429, 5xx, таймауты, обрывы соединения),
+      - общим дедлайном на вызов (включая ожидание лимитов и повторы),
+      - склейкой одинаковых одновременных запросов в один вызов API.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        api_base: Optional[str] = None,
+        api_key: Optional[str] = None,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        http2: bool = False,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        connect_timeout: float = 5.0,
+        request_timeout: float = 30.0,
+        deadline: float = 90.0,
+        coalesce: bool = True,
+        **kwargs,
+    ):
+        self.pool_settings = {
+            "max_connections": max_connections,
+            "max_keepalive_connections": max_keepalive_connections,
+            "keepalive_expiry": keepalive_expiry,
+            "http2": http2,
+        }
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.deadline = deadline
+        self.coalesce = coalesce
+
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+        # Повторы и лимиты делаем сами — встроенные в smolagents отключаем
+        super().__init__(
+            model_id=model_id,
+            api_base=api_base,
+            api_key=api_key,
+            retry=False,
+            **kwargs,
+        )
+
+    def create_client(self):
+        import httpx
+        import openai
+
+        http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=self.pool_settings["max_connections"],
+                max_keepalive_connections=self.pool_settings["max_keepalive_connections"],
+                keepalive_expiry=self.pool_settings["keepalive_expiry"],
+            ),
+            timeout=httpx.Timeout(self.request_timeout, connect=self.connect_timeout),
+            http2=self.pool_settings["http2"],
+        )
+        client = openai.OpenAI(
+            **self.client_kwargs,
+            http_client=http_client,
+            max_retries=0,
+            timeout=self.request_timeout,
+        )
+        return _GuardedClient(self, client)
+
+    def close(self):
+        self.client.close()
+
+    # --- внутренняя логика ---
+
+    @staticmethod
+    def _estimate_tokens(kwargs: Dict[str, Any]) -> int:
+        # Грубая оценка: ~4 символа на токен для входа + максимум на ответ
+        prompt = json.dumps(kwargs.get("messages", []), ensure_ascii=False, default=str)
+        completion = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or 1024
+        return len(prompt) // 4 + completion
+
+    @staticmethod
+    def _coalesce_key(kwargs: Dict[str, Any]) -> str:
+        raw = json.dumps(kwargs, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _guarded_create(self, create, kwargs: Dict[str, Any]):
+        deadline = time.monotonic() + self.deadline
+
+        # Потоковые ответы не склеиваем: итератор нельзя раздать нескольким потребителям
+        if not self.coalesce or kwargs.get("stream"):
+            return self._call_with_retries(create, kwargs, deadline)
+
+        key = self._coalesce_key(kwargs)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not leader:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+
+        try:
+            result = self._call_with_retries(create, kwargs, deadline)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _call_with_retries(self, create, kwargs: Dict[str, Any], deadline: float):
+        estimate = self._estimate_tokens(kwargs)
+        attempt = 0
+
+        while True:
+            self.request_bucket.acquire(1, deadline)
+            self.token_bucket.acquire(estimate, deadline)
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Дедлайн вызова LLM истёк.")
+
+            try:
+                response = create(**kwargs, timeout=min(self.request_timeout, remaining))
+            except Exception as e:
+                # Неудачная попытка токены не потратила
+                self.token_bucket.adjust(-estimate)
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            usage = getattr(response, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                self.token_bucket.adjust(usage.total_tokens - estimate)
+            return response
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        import openai
+
+        if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in RETRYABLE_STATUSES or error.status_code >= 500
+        return False
+
+    def _backoff_delay(self, attempt: int, error: Exception) -> float:
+        # Full jitter: случайная задержка в [0, base * 2^attempt], но не меньше Retry-After от сервера
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
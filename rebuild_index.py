@@ -1,8 +1,22 @@
+import shutil
 from pathlib import Path
-from knowledge_base.vector_store.chroma_repo import ChromaVectorStore
+from typing import Callable, Optional
+from config import config
+from knowledge_base.chunker import chunk_markdown, make_token_counter
+from knowledge_base.vector_store.chroma_repo import (
+    DEFAULT_INDEX_DIR,
+    ChromaVectorStore,
+    new_index_version,
+    publish_index_version,
+)
 
 
-def load_documents_from_folder(folder: str = "knowledge_base/raw"):
+def load_documents_from_folder(
+    folder: str = "knowledge_base/raw",
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+):
     chunks = []
     metadatas = []
     ids = []
@@ -12,32 +26,36 @@ def load_documents_from_folder(folder: str = "knowledge_base/raw"):
         print(f"Каталог '{folder}' не существует. Создайте его её и добавьте .md файлы.")
         return chunks, metadatas, ids
 
-    for file_path in folder_path.rglob("*.md"):
+    # Настройки читаются при вызове, а не при импорте: модуль импортируют бенчмарки, конфиг перезагружается
+    chunking = config["rag"].get("chunking", {})
+    if max_tokens is None:
+        max_tokens = chunking.get("max_tokens", 300)
+    if overlap_tokens is None:
+        overlap_tokens = chunking.get("overlap_tokens", 40)
+    if count_tokens is None:
+        count_tokens = make_token_counter(config["rag"]["embedding_model"])
+
+    for file_path in sorted(folder_path.rglob("*.md")):
         text = file_path.read_text(encoding="utf-8")
+        relative_path = file_path.relative_to(folder_path).with_suffix("").as_posix()
 
-        # Чанкирование по заголовкам и абзацам(для md)
-        lines = text.split('\n')
-        current_chunk = []
-        current_header = file_path.name
-
-        for line in lines:
-            stripped = line.strip()
-            if stripped.startswith('#'):
-                # Новый раздел — сохраняем предыдущий чанк
-                if current_chunk:
-                    chunks.append('\n'.join(current_chunk).strip())
-                    metadatas.append({"source": file_path.name, "header": current_header})
-                    ids.append(f"{file_path.stem}_{len(chunks)}")
-                current_chunk = [line]
-                current_header = stripped
-            else:
-                current_chunk.append(line)
-
-        # Последний чанк
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk).strip())
-            metadatas.append({"source": file_path.name, "header": current_header})
-            ids.append(f"{file_path.stem}_{len(chunks)}")
+        # Чанкирование с бюджетом токенов: по заголовкам, блокам, спискам, таблицам (для md)
+        for i, chunk in enumerate(chunk_markdown(text, count_tokens, max_tokens, overlap_tokens)):
+            chunks.append(chunk.text)
+            metadatas.append(
+                {
+                    "source": file_path.name,
+                    "path": relative_path,
+                    "header": chunk.header_path[-1] if chunk.header_path else file_path.name,
+                    "header_path": " > ".join(chunk.header_path),
+                    "token_count": chunk.token_count,
+                    "byte_start": chunk.byte_start,
+                    "byte_end": chunk.byte_end,
+                    "chunk_index": i,
+                }
+            )
+            # Путь от корня базы знаний: одноимённые файлы в разных подкаталогах не дают одинаковых id
+            ids.append(f"{relative_path}_{i}")
 
     return chunks, metadatas, ids
 
@@ -45,8 +63,6 @@ def load_documents_from_folder(folder: str = "knowledge_base/raw"):
 if __name__ == "__main__":
     print("Перестраиваю базу знаний...")
 
-    store = ChromaVectorStore()
-
     chunks, metadatas, ids = load_documents_from_folder()
 
     if not chunks:
@@ -54,6 +70,17 @@ if __name__ == "__main__":
             "Нет документов в knowledge_base/raw/. Добавь хотя бы один файл с текстом."
         )
     else:
-        store.add_documents(chunks, metadatas, ids)
-        print(f"Успешно добавлено {len(chunks)} чанков в базу знаний.")
+        # Новая версия собирается рядом с текущей: запущенный бот до конца работает с прежней
+        # и переключается, только когда указатель CURRENT подменён на полностью готовый индекс
+        index_dir = config["rag"].get("index_dir", DEFAULT_INDEX_DIR)
+        version = new_index_version(index_dir)
+        try:
+            store = ChromaVectorStore(persist_dir=str(Path(index_dir) / version))
+            store.add_documents(chunks, metadatas, ids)
+            store.close()
+        except BaseException:
+            shutil.rmtree(Path(index_dir) / version, ignore_errors=True)
+            raise
+        publish_index_version(index_dir, version)
+        print(f"Успешно добавлено {len(chunks)} чанков в базу знаний (версия {version}).")
         print("Готово! Теперь запускай: python3 main.py")
@@ -0,0 +1,257 @@
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from smolagents import ToolCallingAgent, DuckDuckGoSearchTool
+
+from config import CONFIG_PATH, config, load_config
+from knowledge_base.vector_store.chroma_repo import (
+    CURRENT_INDEX_FILE,
+    DEFAULT_INDEX_DIR,
+    ChromaVectorStore,
+    make_embedding_function,
+    resolve_index_dir,
+)
+from llm.pooled_model import PooledOpenAIModel
+from tools.rag_tool import retrieve_knowledge, set_vector_store, pinned_vector_store
+from tools.product_db_tool import search_models, get_stock_and_price, get_model_details
+from tools.order_tool import create_order_request
+
+REQUIRED_SECTIONS = ("system_prompt", "llm", "rag", "database")
+
+
+def build_model(llm_config: dict) -> PooledOpenAIModel:
+    return PooledOpenAIModel(
+        model_id=llm_config["model_id"],
+        api_base=llm_config["api_base"],
+        api_key=os.getenv("GEMINI_API_KEY"),
+        temperature=llm_config.get("temperature", 0.7),
+        **llm_config.get("client", {}),
+        # max_output_tokens=llm_config.get("max_tokens"),  # не для всех моделей
+        # max_tokens=llm_config.get("max_tokens", 1024),
+    )
+
+
+def build_agent(model: PooledOpenAIModel) -> ToolCallingAgent:
+    web_search_tool = DuckDuckGoSearchTool(max_results=5)
+
+    return ToolCallingAgent(
+        tools=[
+            # -- RAG
+            retrieve_knowledge,
+            #
+            # -- запросы к БД
+            search_models,
+            get_stock_and_price,
+            get_model_details,
+            create_order_request,
+            #
+            # -- ВЕБ-поиск
+            web_search_tool,
+        ],
+        model=model,
+    )
+
+
+@dataclass(frozen=True)
+class Runtime:
+    """Согласованный набор: конфиг, LLM, агент и векторное хранилище, с которыми обрабатывается запрос."""
+
+    config: dict
+    model: PooledOpenAIModel
+    agent: ToolCallingAgent
+    vector_store: ChromaVectorStore
+
+    @property
+    def system_prompt(self) -> str:
+        return self.config["system_prompt"]
+
+
+def _file_signature(path: Path):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _index_dir(data: dict) -> str:
+    return data["rag"].get("index_dir", DEFAULT_INDEX_DIR)
+
+
+def _index_signature(data: dict):
+    # rebuild_index.py подменяет указатель CURRENT, только когда новая версия индекса собрана полностью
+    return _file_signature(Path(_index_dir(data)) / CURRENT_INDEX_FILE)
+
+
+class RuntimeRegistry:
+    """
+    Держит текущий Runtime и подменяет его без перезапуска процесса.
+
+    Фоновый поток следит за config.yaml и указателем на текущую версию индекса. При изменении
+    новый Runtime собирается заранее и подменяется атомарно. Запрос под `request()` берёт текущий Runtime
+    без ожидания и до конца работает с ним: конфиг и хранилище закрепляются за запросом
+    через contextvars. Запросы учитываются по ресурсам (LLM-клиент, хранилище), а не по Runtime:
+    после правки одного промпта новый Runtime делит модель с прежним, и заменённый ресурс
+    закрывается, когда завершится последний запрос любого Runtime, который им пользуется. Модель эмбеддингов переиспользуется, если её имя в конфиге
+    не изменилось; LLM-клиент пересоздаётся только при изменении секции llm.
+    """
+
+    def __init__(self, config_path: Path = CONFIG_PATH):
+        self.config_path = config_path
+        self._reload_lock = threading.Lock()
+        # Учёт запросов по ресурсам: id ресурса -> число начатых, id -> что закрыть после последнего
+        self._usage_lock = threading.Lock()
+        self._in_flight = {}
+        self._retired = {}
+        self._stop = threading.Event()
+        self._watcher = None
+
+        data = config.snapshot()
+        model = build_model(data["llm"])
+        store = ChromaVectorStore(persist_dir=resolve_index_dir(_index_dir(data)))
+        set_vector_store(store)
+        self.current = Runtime(data, model, build_agent(model), store)
+
+        self._config_signature = _file_signature(self.config_path)
+        self._index_signature = _index_signature(data)
+
+    @contextmanager
+    def request(self):
+        """Закрепляет текущий Runtime за запросом; подмену конфига не ждёт и не задерживает."""
+        with self._usage_lock:
+            runtime = self.current
+            for resource in self._resources(runtime):
+                self._in_flight[id(resource)] = self._in_flight.get(id(resource), 0) + 1
+        try:
+            with config.pinned(runtime.config), pinned_vector_store(runtime.vector_store):
+                yield runtime
+        finally:
+            self._release(runtime)
+
+    @staticmethod
+    def _resources(runtime: Runtime) -> tuple:
+        return runtime.model, runtime.vector_store
+
+    def _release(self, runtime: Runtime):
+        cleanups = []
+        with self._usage_lock:
+            for resource in self._resources(runtime):
+                left = self._in_flight.pop(id(resource)) - 1
+                if left:
+                    self._in_flight[id(resource)] = left
+                elif id(resource) in self._retired:
+                    cleanups.append(self._retired.pop(id(resource)))
+        for cleanup in cleanups:
+            cleanup()
+
+    def _retire(self, resource, cleanup):
+        """
+        Выполняет cleanup сразу, если ресурсом не пользуется ни один запрос, иначе — по завершении
+        последнего. Вызывается после подмены Runtime: новые запросы этот ресурс уже не получат.
+        """
+        with self._usage_lock:
+            if self._in_flight.get(id(resource)):
+                self._retired[id(resource)] = cleanup
+                return
+        cleanup()
+
+    def start_watching(self):
+        settings = self.current.config.get("reload", {})
+        if not settings.get("enabled", True) or self._watcher:
+            return
+        self._watcher = threading.Thread(target=self._watch, name="config-reload", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _signatures(self):
+        return _file_signature(self.config_path), _index_signature(self.current.config)
+
+    def _watch(self):
+        pending = None
+        while not self._stop.wait(self.current.config.get("reload", {}).get("poll_interval_sec", 2)):
+            signatures = self._signatures()
+            if signatures == (self._config_signature, self._index_signature):
+                pending = None
+                continue
+            # Ждём, пока config.yaml перестанет меняться: редактор может сохранять его в несколько приёмов
+            if signatures != pending:
+                pending = signatures
+                continue
+            pending = None
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Ошибка перезагрузки конфигурации: {e}")
+
+    def reload(self) -> bool:
+        """Перечитывает config.yaml и индекс; при изменениях подменяет Runtime. Возвращает True, если подменил."""
+        with self._reload_lock:
+            config_signature = _file_signature(self.config_path)
+            try:
+                data = load_config(self.config_path)
+                if not isinstance(data, dict):
+                    raise ValueError("ожидается YAML-словарь")
+                missing = [section for section in REQUIRED_SECTIONS if section not in data]
+                if missing:
+                    raise ValueError(f"нет секций: {', '.join(missing)}")
+            except Exception as e:
+                # Битый конфиг не применяем и не перечитываем, пока файл снова не изменится,
+                # но перестроенный индекс подхватываем с прежним конфигом
+                self._config_signature = config_signature
+                print(f"config.yaml не перечитан, работаем с прежним: {e}")
+                data = self.current.config
+
+            old = self.current
+            index_signature = _index_signature(data)
+            persist_dir = resolve_index_dir(_index_dir(data))
+            embedding_model = data["rag"]["embedding_model"]
+            embedding_model_changed = embedding_model != old.vector_store.embedding_model
+            store_changed = embedding_model_changed or persist_dir != old.vector_store.persist_dir
+            llm_changed = data["llm"] != old.config["llm"]
+
+            if data == old.config and not store_changed:
+                self._config_signature = config_signature
+                self._index_signature = index_signature
+                return False
+
+            # Тяжёлое готовим до подмены, пока запросы обслуживаются прежним Runtime
+            embedding_function = (
+                make_embedding_function(embedding_model) if embedding_model_changed else old.vector_store.embedding_function
+            )
+            model, agent = old.model, old.agent
+            if llm_changed:
+                model = build_model(data["llm"])
+                agent = build_agent(model)
+
+            store = old.vector_store
+            if store_changed:
+                store = ChromaVectorStore(
+                    persist_dir=persist_dir,
+                    embedding_model=embedding_model,
+                    embedding_function=embedding_function,
+                )
+
+            with self._usage_lock:
+                config.replace(data)
+                set_vector_store(store)
+                self.current = Runtime(data, model, agent, store)
+            self._config_signature = config_signature
+            self._index_signature = index_signature
+
+            if model is not old.model:
+                self._retire(old.model, old.model.close)
+            if store is not old.vector_store:
+                self._retire(old.vector_store, old.vector_store.close)
+
+            changes = ["конфиг"] if data != old.config else []
+            if store_changed:
+                changes.append("индекс" + (" и модель эмбеддингов" if embedding_model_changed else ""))
+            if llm_changed:
+                changes.append("LLM")
+            print(f"Перезагружено без перезапуска: {', '.join(changes)}.")
+            return True
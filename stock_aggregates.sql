@@ -0,0 +1,169 @@
+-- Агрегаты остатков по моделям и триггеры, которые их поддерживают.
+-- Скрипт идемпотентен: применяется к уже существующей БД (tools/stock_aggregates.py)
+-- при первом обращении инструментов или через `python3 check_stock_aggregates.py --rebuild`,
+-- после чего агрегаты заполняются по базовым таблицам.
+
+-- 1. Таблицы-агрегаты
+-- Остатки модели по складам: сумма по всем SKU модели
+CREATE TABLE IF NOT EXISTS model_warehouse_stock (
+    model_id    INTEGER NOT NULL REFERENCES product_models(id) ON DELETE CASCADE,
+    warehouse   TEXT NOT NULL,
+    quantity    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (model_id, warehouse)
+);
+
+-- Итог по модели + готовый к выдаче JSON {"склад": количество}
+CREATE TABLE IF NOT EXISTS model_stock_totals (
+    model_id    INTEGER PRIMARY KEY REFERENCES product_models(id) ON DELETE CASCADE,
+    total_stock INTEGER NOT NULL DEFAULT 0,
+    stock_json  TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE INDEX IF NOT EXISTS idx_products_model_id ON products(model_id);
+CREATE INDEX IF NOT EXISTS idx_model_warehouse_stock_warehouse ON model_warehouse_stock(warehouse, quantity);
+CREATE INDEX IF NOT EXISTS idx_model_stock_totals_total ON model_stock_totals(total_stock);
+
+-- 2. Триггеры поддержки агрегатов
+-- Строка агрегата (модель, склад) не инкрементируется, а пересчитывается по базовым таблицам
+-- (это не больше пары десятков SKU модели). Так агрегаты верны при любой конфликт-политике:
+-- INSERT OR REPLACE удаляет старую строку остатка без срабатывания AFTER DELETE
+-- (recursive_triggers выключен), а INSERT OR IGNORE / UPSERT не вставляют ничего нового.
+-- Итоги обновляются через UPDATE/UPSERT, а не INSERT OR REPLACE: внутри триггера
+-- конфликт-политику OR ... перекрывает внешний оператор (например, INSERT OR IGNORE).
+-- Триггеры пересоздаются при каждом применении скрипта, чтобы миграция обновляла их тела.
+DROP TRIGGER IF EXISTS trg_product_models_ai;
+DROP TRIGGER IF EXISTS trg_product_models_ad;
+DROP TRIGGER IF EXISTS trg_stock_ai;
+DROP TRIGGER IF EXISTS trg_stock_ad;
+DROP TRIGGER IF EXISTS trg_stock_au;
+DROP TRIGGER IF EXISTS trg_products_au_model;
+DROP TRIGGER IF EXISTS trg_products_ad;
+
+-- Новая модель — сразу нулевой итог
+CREATE TRIGGER trg_product_models_ai AFTER INSERT ON product_models
+BEGIN
+    INSERT INTO model_stock_totals (model_id, total_stock, stock_json)
+    VALUES (NEW.id, 0, '{}')
+    ON CONFLICT (model_id) DO UPDATE SET total_stock = 0, stock_json = '{}';
+END;
+
+CREATE TRIGGER trg_product_models_ad AFTER DELETE ON product_models
+BEGIN
+    DELETE FROM model_warehouse_stock WHERE model_id = OLD.id;
+    DELETE FROM model_stock_totals WHERE model_id = OLD.id;
+END;
+
+-- Приход остатка (в т.ч. INSERT OR REPLACE поверх существующей строки)
+CREATE TRIGGER trg_stock_ai AFTER INSERT ON stock_by_warehouses
+WHEN EXISTS (SELECT 1 FROM products WHERE id = NEW.product_id)
+BEGIN
+    DELETE FROM model_warehouse_stock
+    WHERE model_id = (SELECT model_id FROM products WHERE id = NEW.product_id)
+      AND warehouse = NEW.warehouse;
+
+    INSERT INTO model_warehouse_stock (model_id, warehouse, quantity)
+    SELECT p.model_id, sw.warehouse, SUM(sw.quantity)
+    FROM products p
+    JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    WHERE p.model_id = (SELECT model_id FROM products WHERE id = NEW.product_id)
+      AND sw.warehouse = NEW.warehouse
+    GROUP BY p.model_id, sw.warehouse;
+
+    UPDATE model_stock_totals
+    SET total_stock = (SELECT COALESCE(SUM(quantity), 0) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id),
+        stock_json = (SELECT json_group_object(warehouse, quantity) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id)
+    WHERE model_id = (SELECT model_id FROM products WHERE id = NEW.product_id);
+END;
+
+-- Удаление остатка
+-- (при каскадном удалении товара строки products уже нет — пересчёт сделает trg_products_ad)
+CREATE TRIGGER trg_stock_ad AFTER DELETE ON stock_by_warehouses
+WHEN EXISTS (SELECT 1 FROM products WHERE id = OLD.product_id)
+BEGIN
+    DELETE FROM model_warehouse_stock
+    WHERE model_id = (SELECT model_id FROM products WHERE id = OLD.product_id)
+      AND warehouse = OLD.warehouse;
+
+    INSERT INTO model_warehouse_stock (model_id, warehouse, quantity)
+    SELECT p.model_id, sw.warehouse, SUM(sw.quantity)
+    FROM products p
+    JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    WHERE p.model_id = (SELECT model_id FROM products WHERE id = OLD.product_id)
+      AND sw.warehouse = OLD.warehouse
+    GROUP BY p.model_id, sw.warehouse;
+
+    UPDATE model_stock_totals
+    SET total_stock = (SELECT COALESCE(SUM(quantity), 0) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id),
+        stock_json = (SELECT json_group_object(warehouse, quantity) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id)
+    WHERE model_id = (SELECT model_id FROM products WHERE id = OLD.product_id);
+END;
+
+-- Изменение остатка: пересчитываем прежнюю и новую пару (товар/склад тоже могли смениться)
+CREATE TRIGGER trg_stock_au AFTER UPDATE ON stock_by_warehouses
+BEGIN
+    DELETE FROM model_warehouse_stock
+    WHERE model_id = (SELECT model_id FROM products WHERE id = OLD.product_id)
+      AND warehouse = OLD.warehouse;
+
+    INSERT INTO model_warehouse_stock (model_id, warehouse, quantity)
+    SELECT p.model_id, sw.warehouse, SUM(sw.quantity)
+    FROM products p
+    JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    WHERE p.model_id = (SELECT model_id FROM products WHERE id = OLD.product_id)
+      AND sw.warehouse = OLD.warehouse
+    GROUP BY p.model_id, sw.warehouse;
+
+    DELETE FROM model_warehouse_stock
+    WHERE model_id = (SELECT model_id FROM products WHERE id = NEW.product_id)
+      AND warehouse = NEW.warehouse;
+
+    INSERT INTO model_warehouse_stock (model_id, warehouse, quantity)
+    SELECT p.model_id, sw.warehouse, SUM(sw.quantity)
+    FROM products p
+    JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    WHERE p.model_id = (SELECT model_id FROM products WHERE id = NEW.product_id)
+      AND sw.warehouse = NEW.warehouse
+    GROUP BY p.model_id, sw.warehouse;
+
+    UPDATE model_stock_totals
+    SET total_stock = (SELECT COALESCE(SUM(quantity), 0) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id),
+        stock_json = (SELECT json_group_object(warehouse, quantity) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id)
+    WHERE model_id IN (SELECT model_id FROM products WHERE id IN (OLD.product_id, NEW.product_id));
+END;
+
+-- Товар перенесён в другую модель — пересчитываем обе модели по базовым таблицам
+CREATE TRIGGER trg_products_au_model AFTER UPDATE OF model_id ON products
+WHEN OLD.model_id IS NOT NEW.model_id
+BEGIN
+    DELETE FROM model_warehouse_stock WHERE model_id IN (OLD.model_id, NEW.model_id);
+
+    INSERT INTO model_warehouse_stock (model_id, warehouse, quantity)
+    SELECT p.model_id, sw.warehouse, SUM(sw.quantity)
+    FROM products p
+    JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    WHERE p.model_id IN (OLD.model_id, NEW.model_id)
+    GROUP BY p.model_id, sw.warehouse;
+
+    UPDATE model_stock_totals
+    SET total_stock = (SELECT COALESCE(SUM(quantity), 0) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id),
+        stock_json = (SELECT json_group_object(warehouse, quantity) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id)
+    WHERE model_id IN (OLD.model_id, NEW.model_id);
+END;
+
+-- Товар удалён — пересчитываем его модель по базовым таблицам
+CREATE TRIGGER trg_products_ad AFTER DELETE ON products
+BEGIN
+    DELETE FROM model_warehouse_stock WHERE model_id = OLD.model_id;
+
+    INSERT INTO model_warehouse_stock (model_id, warehouse, quantity)
+    SELECT p.model_id, sw.warehouse, SUM(sw.quantity)
+    FROM products p
+    JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    WHERE p.model_id = OLD.model_id
+    GROUP BY p.model_id, sw.warehouse;
+
+    UPDATE model_stock_totals
+    SET total_stock = (SELECT COALESCE(SUM(quantity), 0) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id),
+        stock_json = (SELECT json_group_object(warehouse, quantity) FROM model_warehouse_stock mws WHERE mws.model_id = model_stock_totals.model_id)
+    WHERE model_id = OLD.model_id;
+END;
@@ -5,7 +5,7 @@ from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
-from main import agent, config
+from main import registry
 import os
 from dotenv import load_dotenv
 
@@ -26,6 +26,18 @@ dp = Dispatcher(storage=MemoryStorage())
 chat_histories = {}  # {chat_id: [{"role": "user/assistant", "content": "..."}, ...]}
 
 
+def run_agent(history: list, user_input: str) -> str:
+    # Промпт и агент берутся из одного Runtime: перезагрузка конфига не вклинится посреди запроса
+    with registry.request() as runtime:
+        full_context = runtime.system_prompt + "\n\nИстория диалога:\n"
+        for msg in history:
+            role = "Пользователь" if msg["role"] == "user" else "Агент"
+            full_context += f"{role}: {msg['content']}\n"
+        full_context += f"Пользователь: {user_input}\n"
+
+        return runtime.agent.run(full_context, max_steps=5)
+
+
 class OrderForm(StatesGroup):
     waiting_for_confirmation = State()
 
@@ -52,15 +64,8 @@ async def handle_message(message: types.Message, state: FSMContext):
 
     history = chat_histories[chat_id]
 
-    # Формируем полный контекст
-    full_context = config["system_prompt"] + "\n\nИстория диалога:\n"
-    for msg in history:
-        role = "Пользователь" if msg["role"] == "user" else "Агент"
-        full_context += f"{role}: {msg['content']}\n"
-    full_context += f"Пользователь: {user_input}\n"
-
     try:
-        response = await asyncio.to_thread(agent.run, full_context, max_steps=5)
+        response = await asyncio.to_thread(run_agent, history, user_input)
         await message.answer(response)
 
         # Добавляем в историю
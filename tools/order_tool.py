@@ -1,11 +1,8 @@
-import sqlite3
 from smolagents import tool
 from typing import Optional
 from config import config
-import json
 from datetime import datetime
-
-DB_PATH = config["database"]["path"]
+from tools.order_writer import RESULT_GRACE_SEC, OrderWriterClosed, get_order_writer
 
 
 @tool
@@ -43,33 +40,36 @@ def create_order_request(
         "created_at": datetime.now().isoformat(),
     }
 
-    order_json = json.dumps(order_data, ensure_ascii=False, indent=2)
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        """
-        INSERT INTO orders (
-            user_id, customer_name, customer_phone, order_json
-        ) VALUES (?, ?, ?, ?)
-        """,
-        (user_id, customer_name, customer_phone, order_json),
-    )
-    order_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    # Запись — в отдельном потоке-писателе (group commit, WAL); повтор того же заказа вернёт тот же номер
+    # Писатель сам отказывает заявке, не начатой за timeout, поэтому ждём чуть дольше его и
+    # не сообщаем об ошибке по заявке, которая затем всё-таки запишется
+    timeout = config["database"].get("order_submit_timeout_sec", 10)
+    try:
+        future = get_order_writer().submit(user_id, customer_name, customer_phone, order_data, timeout=timeout)
+    except OrderWriterClosed:
+        # Писателя закрыли (перезагрузка конфига) между get_order_writer() и submit() — берём новый
+        future = get_order_writer().submit(user_id, customer_name, customer_phone, order_data, timeout=timeout)
+    order = future.result(timeout=timeout + RESULT_GRACE_SEC)
 
-    text = f"Заявка #{order_id} создана и отправлена менеджеру!\n\n"
-    for item in items:
+    # Текст строим по сохранённой заявке: при повторе в БД остались прежние склад и комментарий
+    if order.created:
+        text = f"Заявка #{order.order_id} создана и отправлена менеджеру!\n\n"
+    else:
+        text = f"Заявка #{order.order_id} уже была оформлена ранее — новая не создана. Её данные:\n\n"
+    stored = order.order_data
+    for item in stored["items"]:
         text += f"- {item['brand']} {item['model']}, размер {item['size']}"
         if item.get("color"):
             text += f", цвет {item['color']}"
         text += f" — {item['quantity']} шт. по {item['price']} USD\n"
-    text += f"\nИтого: {total_price} USD\n"
-    if warehouse_preference:
-        text += f"Желаемый склад: {warehouse_preference}\n"
-    if notes:
-        text += f"Комментарий: {notes}\n"
+    text += f"\nИтого: {stored['total_price']} USD\n"
+    if stored.get("warehouse_preference"):
+        text += f"Желаемый склад: {stored['warehouse_preference']}\n"
+    if stored.get("notes"):
+        text += f"Комментарий: {stored['notes']}\n"
+    if not order.created:
+        text += f"Телефон для связи: {order.customer_phone}\n"
+        text += "\nЧтобы изменить склад, комментарий или контакты, передайте это менеджеру при звонке."
     text += "\nМенеджер свяжется с вами в ближайшее время для подтверждения и оплаты."
 
     return text
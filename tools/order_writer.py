@@ -0,0 +1,336 @@
+import atexit
+import contextlib
+import hashlib
+import inspect
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from typing import Optional
+from config import config
+
+_STOP = object()
+
+# Сколько раз пробуем взять блокировку записи для заявок без дедлайна (каждая попытка ждёт busy_timeout)
+BEGIN_ATTEMPTS = 3
+BUSY_TIMEOUT_MS = 5000
+
+# Запас сверх дедлайна заявки, за который писатель успевает отказать по ней или закоммитить
+RESULT_GRACE_SEC = 2
+
+_order_writer = None
+_order_writer_lock = threading.Lock()
+
+
+def make_idempotency_key(user_id: str, items: list[dict]) -> str:
+    """
+    Ключ идемпотентности заявки: пользователь + состав заказа.
+    Позиции нормализуются и сортируются, чтобы повтор от LLM с другим порядком items дал тот же ключ.
+    """
+    normalized = sorted(json.dumps(item, ensure_ascii=False, sort_keys=True, default=str) for item in items)
+    raw = json.dumps([str(user_id), normalized], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class OrderWriterClosed(RuntimeError):
+    """Писатель закрыт (например, пересоздан после перезагрузки конфига) — заявку нужно отправить новому."""
+
+
+@dataclass
+class SubmittedOrder:
+    """Результат приёма заявки. При повторе (created=False) — данные уже сохранённой заявки, а не присланные."""
+
+    order_id: int
+    created: bool
+    customer_name: str
+    customer_phone: str
+    order_data: dict
+
+
+class OrderWriter:
+    """
+    Приём заявок одним выделенным потоком-писателем.
+
+    Заявки складываются в очередь, поток пишет их пачками в одной транзакции (group commit)
+    в режиме WAL — читатели каталога не блокируются на время записи. Повтор заявки с тем же
+    ключом идемпотентности в пределах окна возвращает уже созданную заявку (created=False).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        batch_size: int = 64,
+        max_delay_ms: float = 5.0,
+        idempotency_window_sec: int = 600,
+    ):
+        self.db_path = db_path
+        # Настройки, с которыми создан писатель: по ним get_order_writer решает, пересоздавать ли его
+        self.settings = {
+            "batch_size": batch_size,
+            "max_delay_ms": max_delay_ms,
+            "idempotency_window_sec": idempotency_window_sec,
+        }
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.idempotency_window_sec = idempotency_window_sec
+
+        self.queue: queue.Queue = queue.Queue()
+        # submit и close под одной блокировкой: после _STOP в очередь ничего не попадает
+        self._state_lock = threading.Lock()
+        self._closed = False
+        self.ready = threading.Event()
+        self.startup_error: Optional[BaseException] = None
+        self.thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.startup_error:
+            raise self.startup_error
+
+    def submit(
+        self,
+        user_id: str,
+        customer_name: str,
+        customer_phone: str,
+        order_data: dict,
+        timeout: Optional[float] = None,
+    ) -> Future:
+        """
+        Ставит заявку в очередь. Future вернёт SubmittedOrder с номером заявки (id в таблице orders).
+
+        С `timeout` заявка, которую не успели начать записывать за это время, не пишется вовсе:
+        Future завершится TimeoutError не позже чем через timeout + RESULT_GRACE_SEC, и ждать
+        дольше вызывающему не нужно — заявка не окажется в БД после того, как он сдался.
+        """
+        future = Future()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        key = make_idempotency_key(user_id, order_data.get("items", []))
+        order_json = json.dumps(order_data, ensure_ascii=False, separators=(",", ":"))
+        with self._state_lock:
+            if self._closed or not self.thread.is_alive():
+                raise OrderWriterClosed("Поток записи заявок остановлен.")
+            self.queue.put((future, deadline, (user_id, customer_name, customer_phone, order_json, key)))
+        return future
+
+    def close(self):
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self.thread.is_alive():
+                self.queue.put(_STOP)
+        self.thread.join()
+
+    # --- поток-писатель ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # В WAL режим NORMAL не теряет целостность, но не делает fsync на каждый коммит
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(orders)")}
+        if "idempotency_key" not in columns:
+            conn.execute("ALTER TABLE orders ADD COLUMN idempotency_key TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_orders_idempotency_key ON orders(idempotency_key)")
+        return conn
+
+    def _run(self):
+        try:
+            conn = self._connect()
+        except BaseException as e:
+            self.startup_error = e
+            self.ready.set()
+            return
+        self.ready.set()
+
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            if batch[0] is _STOP:
+                break
+
+            # Собираем пачку: всё, что уже в очереди, плюс то, что успеет прийти за max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    entry = self.queue.get(timeout=self.max_delay)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:
+                # Сбой пачки завершает с ошибкой только её заявки — поток продолжает принимать новые
+                with contextlib.suppress(sqlite3.Error):
+                    self._rollback(conn)
+                for future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+        conn.close()
+        # Заявки, оставшиеся в очереди после остановки, не должны ждать ответа до таймаута
+        while True:
+            try:
+                entry = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP and not entry[0].done():
+                entry[0].set_exception(OrderWriterClosed("Поток записи заявок остановлен."))
+
+    @staticmethod
+    def _is_busy(error: sqlite3.OperationalError) -> bool:
+        code = getattr(error, "sqlite_errorcode", None)
+        if code is not None:
+            return code & 0xFF == sqlite3.SQLITE_BUSY
+        return "database is locked" in str(error)
+
+    def _begin(self, conn: sqlite3.Connection, deadline: Optional[float]):
+        """Берёт блокировку записи; с дедлайном ждёт её не дольше дедлайна."""
+        attempt = 0
+        while True:
+            busy_timeout = BUSY_TIMEOUT_MS
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("База данных занята: заявка не записана.")
+                busy_timeout = min(busy_timeout, int(remaining * 1000) + 1)
+            conn.execute(f"PRAGMA busy_timeout={busy_timeout}")
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                attempt += 1
+                if not self._is_busy(e) or (deadline is None and attempt == BEGIN_ATTEMPTS):
+                    raise
+
+    @staticmethod
+    def _batch_deadline(batch: list) -> Optional[float]:
+        deadlines = [deadline for _, deadline, _ in batch]
+        return None if None in deadlines else max(deadlines)
+
+    @staticmethod
+    def _drop_expired(batch: list) -> list:
+        """Отказывает заявкам, чей дедлайн уже прошёл (вызывающий их больше не ждёт), возвращает остальные."""
+        now = time.monotonic()
+        alive = []
+        for entry in batch:
+            future, deadline, _ = entry
+            if deadline is not None and deadline <= now:
+                future.set_exception(TimeoutError("База данных занята: заявка не записана."))
+            else:
+                alive.append(entry)
+        return alive
+
+    @staticmethod
+    def _rollback(conn: sqlite3.Connection):
+        # После IOERR/FULL SQLite может откатить транзакцию сам — тогда ROLLBACK упадёт
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: list):
+        batch = self._drop_expired(batch)
+        if not batch:
+            return
+        # Не удалось взять блокировку — дело не в заявках, писать по одной бессмысленно
+        self._begin(conn, self._batch_deadline(batch))
+        # Пока ждали блокировку, часть заявок могла просрочиться — их уже не пишем
+        batch = self._drop_expired(batch)
+        try:
+            results = self._insert_all(conn, batch)
+            conn.execute("COMMIT")
+        except Exception:
+            self._rollback(conn)
+            # Одна «плохая» заявка не должна ронять всю пачку — пишем по одной
+            for entry in batch:
+                future, deadline, _ = entry
+                try:
+                    self._begin(conn, deadline)
+                    (result,) = self._insert_all(conn, [entry])
+                    conn.execute("COMMIT")
+                except Exception as e:
+                    self._rollback(conn)
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            return
+
+        for (future, _, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def _insert_all(self, conn: sqlite3.Connection, batch: list) -> list[SubmittedOrder]:
+        # Писатель один, поэтому проверка «есть ли уже такая заявка» + вставка не гоняются между собой
+        seen = {}
+        results = []
+        for _, _, (user_id, customer_name, customer_phone, order_json, key) in batch:
+            if key in seen:
+                results.append(replace(seen[key], created=False))
+                continue
+            row = conn.execute(
+                """
+                SELECT id, customer_name, customer_phone, order_json FROM orders
+                WHERE idempotency_key = ? AND created_at >= datetime('now', ?)
+                ORDER BY id DESC LIMIT 1
+                """,
+                (key, f"-{self.idempotency_window_sec} seconds"),
+            ).fetchone()
+            if row:
+                # Ключ — пользователь и состав заказа; склад, комментарий и телефон повтора
+                # могут отличаться, но в БД остались прежние — их и возвращаем
+                order_id, stored_name, stored_phone, stored_json = row
+                result = SubmittedOrder(order_id, False, stored_name, stored_phone, json.loads(stored_json))
+            else:
+                cursor = conn.execute(
+                    """
+                    INSERT INTO orders (
+                        user_id, customer_name, customer_phone, order_json, idempotency_key
+                    ) VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (user_id, customer_name, customer_phone, order_json, key),
+                )
+                result = SubmittedOrder(cursor.lastrowid, True, customer_name, customer_phone, json.loads(order_json))
+            seen[key] = result
+            results.append(result)
+        return results
+
+
+def _effective_settings(settings: dict) -> dict:
+    """Настройки из конфига, дополненные значениями по умолчанию из OrderWriter."""
+    parameters = inspect.signature(OrderWriter).parameters
+    return {name: settings.get(name, p.default) for name, p in parameters.items() if name != "db_path"}
+
+
+def get_order_writer() -> OrderWriter:
+    global _order_writer
+    with _order_writer_lock:
+        db_path = config["database"]["path"]
+        settings = config["database"].get("order_writer", {})
+        # После перезагрузки конфига с другой БД или настройками — дописываем очередь старым писателем и заводим новый
+        if _order_writer is not None and (
+            (_order_writer.db_path, _order_writer.settings) != (db_path, _effective_settings(settings))
+        ):
+            _order_writer.close()
+            _order_writer = None
+        # Поток мог упасть — без нового писателя приём заявок встал бы до перезапуска
+        if _order_writer is not None and not _order_writer.thread.is_alive():
+            _order_writer = None
+        if _order_writer is None:
+            _order_writer = OrderWriter(db_path, **settings)
+        return _order_writer
+
+
+def close_order_writer():
+    global _order_writer
+    with _order_writer_lock:
+        if _order_writer is not None:
+            _order_writer.close()
+            _order_writer = None
+
+
+atexit.register(close_order_writer)
@@ -4,8 +4,7 @@ from typing import Optional
 from config import config
 import json
 from collections import defaultdict
-
-DB_PATH = config["database"]["path"]
+from tools.stock_aggregates import ensure_stock_aggregates_once
 
 
 @tool
@@ -13,6 +12,7 @@ def search_models(
     brand: Optional[str] = None,
     model: Optional[str] = None,
     purpose: Optional[str] = None,
+    in_stock_only: bool = False,
 ) -> str:
     """
     Ищет подходящие модели кроссовок по бренду, модели или назначению.
@@ -22,27 +22,26 @@ def search_models(
         brand: Бренд (Nike, Adidas и т.д.). Частичное совпадение.
         model: Название модели. Частичное совпадение.
         purpose: Для чего нужны (бег, город, повседневка, тренировки и т.д.).
+        in_stock_only: Только модели, которые есть в наличии (общий остаток > 0).
 
     Returns:
         str: JSON-массив моделей с остатками по складам (или сообщение об ошибке/отсутствии).
     """
-    conn = sqlite3.connect(DB_PATH)
+    db_path = config["database"]["path"]
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
+    # Остатки берём из агрегатов, которые поддерживают триггеры (см. stock_aggregates.sql)
     query = """
     SELECT
         pm.id,
         pm.brand,
         pm.model,
         pm.description,
-        COALESCE(SUM(sw.quantity), 0) AS total_stock,
-        json_group_object(
-            sw.warehouse,
-            COALESCE(sw.quantity, 0)
-        ) FILTER (WHERE sw.quantity IS NOT NULL) AS stock_by_warehouse_json
+        COALESCE(t.total_stock, 0) AS total_stock,
+        t.stock_json AS stock_by_warehouse_json
     FROM product_models pm
-    LEFT JOIN products p ON p.model_id = pm.id
-    LEFT JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    LEFT JOIN model_stock_totals t ON t.model_id = pm.id
     WHERE 1=1
     """
     params = []
@@ -56,13 +55,15 @@ def search_models(
     if purpose:
         query += " AND pm.description LIKE ?"
         params.append(f"%{purpose}%")
+    if in_stock_only:
+        query += " AND t.total_stock > 0"
 
     query += """
-    GROUP BY pm.id
     ORDER BY total_stock DESC
     """
 
     try:
+        ensure_stock_aggregates_once(conn, db_path)
         cursor.execute(query, params)
         rows = cursor.fetchall()
     except sqlite3.Error as e:
@@ -104,25 +105,28 @@ def get_model_details(brand: str, model: str) -> str:
     Returns:
         str: JSON с описанием, общим количеством и остатками по складам (или сообщение "не найдено").
     """
-    conn = sqlite3.connect(DB_PATH)
+    db_path = config["database"]["path"]
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
     query = """
     SELECT
         pm.description,
-        COALESCE(SUM(sw.quantity), 0) AS total_stock,
-        json_group_object(
-            sw.warehouse,
-            COALESCE(sw.quantity, 0)
-        ) AS stock_by_warehouse_json
+        COALESCE(t.total_stock, 0) AS total_stock,
+        t.stock_json AS stock_by_warehouse_json
     FROM product_models pm
-    LEFT JOIN products p ON p.model_id = pm.id
-    LEFT JOIN stock_by_warehouses sw ON sw.product_id = p.id
+    LEFT JOIN model_stock_totals t ON t.model_id = pm.id
     WHERE pm.brand LIKE ? AND pm.model LIKE ?
-    GROUP BY pm.id
+    ORDER BY pm.id
     """
-    cursor.execute(query, (f"%{brand}%", f"%{model}%"))
-    row = cursor.fetchone()
+    try:
+        ensure_stock_aggregates_once(conn, db_path)
+        cursor.execute(query, (f"%{brand}%", f"%{model}%"))
+        row = cursor.fetchone()
+    except sqlite3.Error as e:
+        conn.close()
+        return f"Ошибка базы данных: {e}"
+
     conn.close()
 
     if not row:
@@ -173,7 +177,7 @@ def get_stock_and_price(
     Returns:
         str: JSON с найденными товарами, ценами и наличием по складам (или текст для человека, если JSON не нужен).
     """
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(config["database"]["path"])
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -1,40 +1,141 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from difflib import SequenceMatcher
 from smolagents import tool
-from typing import List, Dict
+from typing import List, Dict, Optional
+from config import config
 
 _vector_store = None
 
+# Совпадение короче этого — случайное (общие слова, строка заголовка), а не перекрытие чанков
+MIN_OVERLAP_CHARS = 40
+
+# Хранилище, закреплённое за текущим запросом (RuntimeRegistry.request), — приоритетнее глобального
+_pinned_vector_store = ContextVar("pinned_vector_store", default=None)
+
 
 def get_vector_store():
-    global _vector_store
-    if _vector_store is None:
+    vector_store = _pinned_vector_store.get() or _vector_store
+    if vector_store is None:
         raise RuntimeError("Ошибка: база знаний не инициализирована.")
-    return _vector_store
+    return vector_store
+
+
+@contextmanager
+def pinned_vector_store(store):
+    token = _pinned_vector_store.set(store)
+    try:
+        yield
+    finally:
+        _pinned_vector_store.reset(token)
+
+
+def _token_count(res: Dict) -> int:
+    # Для индекса, собранного до появления token_count в метаданных, — грубая оценка
+    return res["metadata"].get("token_count") or len(res["text"]) // 4 + 1
+
+
+def _trim(text: str, tokens: int, budget: int) -> str:
+    """Обрезает текст пропорционально бюджету по границе слова."""
+    cut = text[: len(text) * budget // tokens]
+    if " " in cut:
+        cut = cut[: cut.rfind(" ")]
+    return cut.rstrip() + " …"
+
+
+def _span(res: Dict):
+    """(файл, начало, конец) фрагмента в байтах исходного файла, если индекс их хранит."""
+    meta = res["metadata"]
+    if meta.get("byte_start") is None or meta.get("byte_end") is None:
+        return None
+    return meta.get("path") or meta.get("source"), meta["byte_start"], meta["byte_end"]
+
+
+def _remove_overlap(text: str, kept_text: str) -> str:
+    """Убирает из text кусок, дословно повторяющий уже отобранный соседний чанк (перекрытие)."""
+    match = SequenceMatcher(None, kept_text, text, autojunk=False).find_longest_match(
+        0, len(kept_text), 0, len(text)
+    )
+    if match.size < MIN_OVERLAP_CHARS:
+        return text
+    return (text[:match.b].rstrip() + "\n\n" + text[match.b + match.size:].lstrip()).strip()
+
+
+def fit_to_budget(results: List[Dict], max_tokens: int) -> List[Dict]:
+    """
+    Оставляет найденные фрагменты (по убыванию релевантности) в пределах общего бюджета токенов.
+    Перекрытие соседних чанков не тратит бюджет дважды: фрагмент, целиком лежащий внутри уже
+    отобранного (по байтовым смещениям в файле), отбрасывается, а у частично перекрывающегося
+    вырезается повторяющийся текст. Последний фрагмент обрезается по остатку бюджета.
+    """
+    fitted = []
+    kept = []  # [(span, текст)]
+    used = 0
+    seen = set()
+    for res in results:
+        text = res["text"].strip()
+        if text in seen:
+            continue
+        seen.add(text)
+
+        tokens = _token_count(res)
+        span = _span(res)
+        if span:
+            path, start, end = span
+            overlapping = [
+                (kept_span, kept_text)
+                for kept_span, kept_text in kept
+                if kept_span[0] == path and kept_span[1] < end and start < kept_span[2]
+            ]
+            if any(kept_start <= start and end <= kept_end for (_, kept_start, kept_end), _ in overlapping):
+                continue
+            original_length = len(text)
+            for _, kept_text in overlapping:
+                text = _remove_overlap(text, kept_text)
+            if len(text) < original_length:
+                tokens = max(1, tokens * len(text) // original_length)
+
+        remaining = max_tokens - used
+        if remaining <= 0:
+            break
+        if tokens > remaining:
+            # Слишком маленький остаток бюджета не стоит обрезка
+            if remaining >= 32:
+                fitted.append({**res, "text": _trim(text, tokens, remaining)})
+            break
+        fitted.append({**res, "text": text})
+        if span:
+            kept.append((span, res["text"].strip()))
+        used += tokens
+    return fitted
 
 
 @tool
-def retrieve_knowledge(query: str, top_k: int = 6) -> str:
+def retrieve_knowledge(query: str, top_k: Optional[int] = None) -> str:
     """
     Ищет релевантные фрагменты из базы знаний техподдержки.
 
     Args:
         query (str): Поисковый запрос.
-        top_k (int): Количество возвращаемых фрагментов (по умолчанию 6).
+        top_k (int): Количество возвращаемых фрагментов (по умолчанию — из настроек).
 
     Returns:
         str: Найденные фрагменты или сообщение об ошибке.
     """
     try:
         vector_store = get_vector_store()
-        results: List[Dict] = vector_store.similarity_search(query, k=top_k)
+        results: List[Dict] = vector_store.similarity_search(query, k=top_k or config["rag"]["top_k"])
 
         if not results:
             return "В базе знаний не найдено релевантной информации по вашему запросу."
 
         formatted = []
-        for i, res in enumerate(results, 1):
+        for i, res in enumerate(fit_to_budget(results, config["rag"].get("max_context_tokens", 1500)), 1):
             source = res["metadata"].get("source", "неизвестно")
-            text = res["text"].strip()
-            formatted.append(f"[Источник: {source}]\n{text}")
+            header_path = res["metadata"].get("header_path")
+            if header_path:
+                source += f" | Раздел: {header_path}"
+            formatted.append(f"[Источник: {source}]\n{res['text']}")
 
         return "\n\n".join(formatted)
 
@@ -0,0 +1,85 @@
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+SCHEMA_PATH = Path(__file__).resolve().parent.parent / "stock_aggregates.sql"
+
+# Эталон: агрегаты, посчитанные напрямую по products + stock_by_warehouses
+BASE_WAREHOUSE_STOCK_QUERY = """
+SELECT p.model_id, sw.warehouse, SUM(sw.quantity) AS quantity
+FROM products p
+JOIN stock_by_warehouses sw ON sw.product_id = p.id
+GROUP BY p.model_id, sw.warehouse
+"""
+
+REBUILD_SQL = f"""
+DELETE FROM model_warehouse_stock;
+DELETE FROM model_stock_totals;
+INSERT INTO model_warehouse_stock (model_id, warehouse, quantity) {BASE_WAREHOUSE_STOCK_QUERY};
+INSERT INTO model_stock_totals (model_id, total_stock, stock_json)
+SELECT
+    pm.id,
+    COALESCE(SUM(mws.quantity), 0),
+    COALESCE(json_group_object(mws.warehouse, mws.quantity) FILTER (WHERE mws.warehouse IS NOT NULL), '{{}}')
+FROM product_models pm
+LEFT JOIN model_warehouse_stock mws ON mws.model_id = pm.id
+GROUP BY pm.id;
+"""
+
+TABLE_OR_INDEX_RE = re.compile(r"CREATE\s+(TABLE|INDEX)\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.I)
+TRIGGER_RE = re.compile(r"^CREATE TRIGGER (\w+).*?^END", re.S | re.M)
+
+_migrated = set()
+_migrated_lock = threading.Lock()
+
+
+def _schema_outdated(conn: sqlite3.Connection, schema: str) -> bool:
+    """Нет какой-то таблицы/индекса из схемы или тело триггера отличается от текущего скрипта."""
+    existing = {(kind, name): sql for kind, name, sql in conn.execute("SELECT type, name, sql FROM sqlite_master")}
+    for kind, name in TABLE_OR_INDEX_RE.findall(schema):
+        if (kind.lower(), name) not in existing:
+            return True
+    # SQLite хранит текст CREATE TRIGGER как есть (без завершающей «;») — сравниваем целиком
+    return any(existing.get(("trigger", m.group(1))) != m.group(0) for m in TRIGGER_RE.finditer(schema))
+
+
+def _run_in_transaction(conn: sqlite3.Connection, script: str):
+    # executescript сам коммитит открытую транзакцию, поэтому BEGIN/COMMIT — внутри скрипта
+    try:
+        conn.executescript("BEGIN IMMEDIATE;\n" + script + "\nCOMMIT;")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+
+
+def rebuild_aggregates(conn: sqlite3.Connection):
+    """Применяет stock_aggregates.sql (таблицы, индексы, триггеры) и полностью пересобирает агрегаты по базовым таблицам."""
+    schema = SCHEMA_PATH.read_text(encoding="utf-8")
+    _run_in_transaction(conn, schema + REBUILD_SQL)
+
+
+def ensure_stock_aggregates(conn: sqlite3.Connection) -> bool:
+    """
+    Миграция для БД, созданной без агрегатов или с прежними триггерами: если чего-то из
+    stock_aggregates.sql не хватает или триггеры устарели — применяет скрипт и заполняет
+    агрегаты заново. Возвращает True, если схема была обновлена.
+    """
+    schema = SCHEMA_PATH.read_text(encoding="utf-8")
+    if not _schema_outdated(conn, schema):
+        return False
+    # Триггеров могло не быть (или они ошибались), пока остатки менялись, — агрегатам верить нельзя
+    _run_in_transaction(conn, schema + REBUILD_SQL)
+    return True
+
+
+def ensure_stock_aggregates_once(conn: sqlite3.Connection, db_path: str):
+    """То же, что ensure_stock_aggregates, но проверяет каждую БД один раз за процесс."""
+    if db_path in _migrated:
+        return
+    with _migrated_lock:
+        if db_path not in _migrated:
+            if ensure_stock_aggregates(conn):
+                print(f"БД {db_path}: агрегаты остатков и триггеры созданы/обновлены.")
+            _migrated.add(db_path)